@@ -1,24 +1,36 @@
 import os
 import gzip
 
+import log_index
+
 keywords = ["137", "killed", "oom", "out of memory", "memory limit", "no memory"]
 
 memory_logs = []
 
-# Only search in failed logs directory
-for root, dirs, files in os.walk("logs_failure"):
-    for file in files:
-        if file.endswith(".txt") or file.endswith(".log"):
+db_path = os.environ.get("LOG_INDEX")
+if db_path:
+    # query the full-text index (refreshed incrementally) instead of reading every file
+    conn = log_index.open_index(db_path)
+    log_index.update_index(conn, ["logs_failure"])
+    for path in log_index.matching_files(conn, keywords):
+        if path.endswith(".txt") or path.endswith(".log"):
+            memory_logs.append(path)
+    conn.close()
+else:
+    # Only search in failed logs directory
+    for root, dirs, files in os.walk("logs_failure"):
+        for file in files:
+            if file.endswith(".txt") or file.endswith(".log"):
 
-            path = os.path.join(root, file)
-            try:
-                with open(path, "r", errors="ignore") as f:
-                    content = f.read().lower()
+                path = os.path.join(root, file)
+                try:
+                    with open(path, "r", errors="ignore") as f:
+                        content = f.read().lower()
 
-                if any(k in content for k in keywords):
-                    memory_logs.append(path)
-            except:
-                pass
+                    if any(k in content for k in keywords):
+                        memory_logs.append(path)
+                except:
+                    pass
 
 with open("memory_logs.txt", "w") as f:
     for log in memory_logs:
@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+"""Persistent full-text index over the extracted logs.
+
+Extracted run directories under `logs_failure/` (and `logs_normal/` if
+present) are tokenized once into an SQLite FTS5 database (`logs_index.sqlite`)
+so that new failure signatures can be tried without rescanning the raw files.
+Indexing is incremental: files are only re-read when their size or mtime
+changes, and files that disappear from disk are dropped from the index.
+
+Log text is stored lower-cased and tokenized into trigrams, so a term matches
+wherever it occurs as a substring -- the same semantics as the
+`k in content.lower()` checks used by `filter_momory_logs.py` and
+`prepare_features.py`. Per-file hit counts for the pipeline keywords are
+cached and kept up to date as files are re-indexed, so repeated keyword
+queries are answered from the cache; one-off `term` queries are answered from
+the index without being added to the cache (`forget` drops cached terms).
+
+Usage:
+    python3 log_index.py build [BASE_DIR ...]
+    python3 log_index.py term "out of memory"
+    python3 log_index.py query '"exit code 137" AND killed'
+    python3 log_index.py regex 'exit code 13[79]' --prefilter "exit code 13"
+    python3 log_index.py forget "memory limit"
+"""
+import os
+import re
+import sqlite3
+import argparse
+from collections import Counter, defaultdict
+
+DEFAULT_DB = os.environ.get("LOG_INDEX", "logs_index.sqlite")
+BASE_DIRS = ("logs_failure", "logs_normal")
+
+TEXT_EXTENSIONS = (".txt", ".log", ".out", ".err", ".trace")
+MAX_UNTYPED_TEXT_SIZE = 200000
+
+# trigram tokenizer cannot match terms shorter than this; those fall back to a scan
+_MIN_FTS_TERM = 3
+
+# bump when the stored text or schema changes; older indexes are rebuilt from scratch
+_INDEX_VERSION = 1
+
+# SQLite truncates text at NUL, so NULs are stored as a character no keyword contains
+_NUL_REPLACEMENT = "\ufffd"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    base_dir TEXT NOT NULL,
+    run_dir TEXT NOT NULL,
+    path TEXT NOT NULL UNIQUE,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    is_text INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_run ON files (base_dir, run_dir);
+CREATE VIRTUAL TABLE IF NOT EXISTS docs USING fts5 (content, tokenize='trigram');
+CREATE TABLE IF NOT EXISTS terms (term TEXT PRIMARY KEY);
+CREATE TABLE IF NOT EXISTS hits (
+    term TEXT NOT NULL,
+    file_id INTEGER NOT NULL,
+    n INTEGER NOT NULL,
+    PRIMARY KEY (term, file_id)
+);
+CREATE INDEX IF NOT EXISTS hits_file ON hits (file_id);
+"""
+
+_TABLES = ("files", "docs", "terms", "hits")
+
+
+def is_text_file(filename, size):
+    """Same rule prepare_features.py has always used to pick files to inspect."""
+    return filename.lower().endswith(TEXT_EXTENSIONS) or size < MAX_UNTYPED_TEXT_SIZE
+
+
+def open_index(db_path=DEFAULT_DB):
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    if conn.execute("PRAGMA user_version").fetchone()[0] != _INDEX_VERSION:
+        for table in _TABLES:
+            conn.execute(f"DROP TABLE IF EXISTS {table}")
+        conn.execute(f"PRAGMA user_version = {_INDEX_VERSION}")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def _fts_phrase(term):
+    return '"' + term.replace('"', '""') + '"'
+
+
+def _drop_file(conn, file_id):
+    conn.execute("DELETE FROM docs WHERE rowid = ?", (file_id,))
+    conn.execute("DELETE FROM hits WHERE file_id = ?", (file_id,))
+    conn.execute("DELETE FROM files WHERE id = ?", (file_id,))
+
+
+def _index_file(conn, base_dir, run_dir, path, st, cached_terms):
+    is_text = is_text_file(os.path.basename(path), st.st_size)
+    content = None
+    if is_text:
+        try:
+            with open(path, "r", errors="ignore") as fh:
+                content = fh.read().lower().replace("\x00", _NUL_REPLACEMENT)
+        except OSError:
+            is_text = False
+
+    cur = conn.execute(
+        "INSERT INTO files (base_dir, run_dir, path, size, mtime_ns, is_text) VALUES (?, ?, ?, ?, ?, ?)",
+        (base_dir, run_dir, path, st.st_size, st.st_mtime_ns, int(is_text)),
+    )
+    file_id = cur.lastrowid
+    if content is None:
+        return
+    conn.execute("INSERT INTO docs (rowid, content) VALUES (?, ?)", (file_id, content))
+    conn.executemany(
+        "INSERT INTO hits (term, file_id, n) VALUES (?, ?, ?)",
+        [(t, file_id, content.count(t)) for t in cached_terms if t in content],
+    )
+
+
+def update_index(conn, base_dirs=BASE_DIRS):
+    """Bring the index in line with the run directories (and any loose files)
+    under each base_dir on disk.
+
+    Only new or modified files are read. Returns (added, updated, removed) file counts.
+    """
+    cached_terms = [r[0] for r in conn.execute("SELECT term FROM terms")]
+    added = updated = removed = 0
+
+    for base_dir in base_dirs:
+        known = {
+            path: (file_id, size, mtime_ns)
+            for file_id, path, size, mtime_ns in conn.execute(
+                "SELECT id, path, size, mtime_ns FROM files WHERE base_dir = ?", (base_dir,)
+            )
+        }
+        def index_path(run_dir, fp):
+            nonlocal added, updated
+            try:
+                st = os.stat(fp)
+            except OSError:
+                return
+            prev = known.pop(fp, None)
+            if prev is not None:
+                if prev[1:] == (st.st_size, st.st_mtime_ns):
+                    return
+                _drop_file(conn, prev[0])
+                updated += 1
+            else:
+                added += 1
+            _index_file(conn, base_dir, run_dir, fp, st, cached_terms)
+
+        if os.path.isdir(base_dir):
+            names = sorted(os.listdir(base_dir))
+        else:
+            names = []
+
+        for name in names:
+            path = os.path.join(base_dir, name)
+            if not os.path.isdir(path):
+                # loose files directly under base_dir are indexed with an empty run_dir
+                index_path("", path)
+                continue
+            for root, dirs, files in os.walk(path):
+                for fn in files:
+                    index_path(name, os.path.join(root, fn))
+            # commit per run so an interrupted build keeps its progress
+            conn.commit()
+
+        for file_id, _, _ in known.values():
+            _drop_file(conn, file_id)
+            removed += 1
+        conn.commit()
+
+    return added, updated, removed
+
+
+def _candidates(conn, term):
+    """Yield (file_id, content) for text files that may contain `term`."""
+    if len(term) >= _MIN_FTS_TERM:
+        return conn.execute("SELECT rowid, content FROM docs WHERE docs MATCH ?", (_fts_phrase(term),))
+    return conn.execute("SELECT rowid, content FROM docs")
+
+
+def _term_hits(conn, term):
+    """Return [(file_id, occurrences)] for every text file containing `term`."""
+    return [(file_id, content.count(term)) for file_id, content in _candidates(conn, term) if term in content]
+
+
+def _ensure_terms(conn, terms):
+    """Populate the hit cache for any term not cached yet."""
+    missing = [
+        t for t in dict.fromkeys(terms)
+        if conn.execute("SELECT 1 FROM terms WHERE term = ?", (t,)).fetchone() is None
+    ]
+    for t in missing:
+        rows = [(t, file_id, n) for file_id, n in _term_hits(conn, t)]
+        conn.executemany("INSERT OR REPLACE INTO hits (term, file_id, n) VALUES (?, ?, ?)", rows)
+        conn.execute("INSERT INTO terms (term) VALUES (?)", (t,))
+    if missing:
+        conn.commit()
+
+
+def keyword_counts(conn, keywords, base_dir="logs_failure"):
+    """Return {run_dir: Counter(keyword -> occurrences)} for runs with at least one hit.
+
+    Loose files outside any run directory are not counted.
+    """
+    keywords = [k.lower() for k in keywords]
+    _ensure_terms(conn, keywords)
+    counts = defaultdict(Counter)
+    placeholders = ",".join("?" * len(keywords))
+    for run_dir, term, n in conn.execute(
+        f"SELECT f.run_dir, h.term, SUM(h.n) FROM hits h JOIN files f ON f.id = h.file_id "
+        f"WHERE f.base_dir = ? AND f.run_dir != '' AND h.term IN ({placeholders}) "
+        f"GROUP BY f.run_dir, h.term",
+        [base_dir, *keywords],
+    ):
+        counts[run_dir][term] = n
+    return counts
+
+
+def term_counts(conn, term, base_dir="logs_failure"):
+    """Return {run_dir: occurrences} for a one-off `term` without caching it."""
+    term = term.lower()
+    counts = Counter()
+    for file_id, n in _term_hits(conn, term):
+        row = conn.execute(
+            "SELECT run_dir FROM files WHERE id = ? AND base_dir = ? AND run_dir != ''",
+            (file_id, base_dir),
+        ).fetchone()
+        if row is not None:
+            counts[row[0]] += n
+    return counts
+
+
+def forget_terms(conn, terms):
+    """Drop `terms` from the hit cache so builds stop counting them. Returns how many were cached."""
+    terms = [t.lower() for t in terms]
+    dropped = 0
+    for t in terms:
+        dropped += conn.execute("DELETE FROM terms WHERE term = ?", (t,)).rowcount
+        conn.execute("DELETE FROM hits WHERE term = ?", (t,))
+    conn.commit()
+    return dropped
+
+
+def matching_files(conn, keywords, base_dir="logs_failure"):
+    """Return sorted paths of files containing any of `keywords`."""
+    keywords = [k.lower() for k in keywords]
+    _ensure_terms(conn, keywords)
+    placeholders = ",".join("?" * len(keywords))
+    rows = conn.execute(
+        f"SELECT DISTINCT f.path FROM hits h JOIN files f ON f.id = h.file_id "
+        f"WHERE f.base_dir = ? AND h.term IN ({placeholders}) ORDER BY f.path",
+        [base_dir, *keywords],
+    )
+    return [r[0] for r in rows]
+
+
+def run_stats(conn, base_dir="logs_failure"):
+    """Return {run_dir: (file_count, text_file_count, total_size)} from the index.
+
+    Only run directories that contain files appear; loose files are skipped.
+    """
+    return {
+        run_dir: (file_count, text_file_count, total_size)
+        for run_dir, file_count, text_file_count, total_size in conn.execute(
+            "SELECT run_dir, COUNT(*), SUM(is_text), SUM(size) FROM files "
+            "WHERE base_dir = ? AND run_dir != '' GROUP BY run_dir ORDER BY run_dir",
+            (base_dir,),
+        )
+    }
+
+
+def search(conn, query):
+    """Run a raw FTS5 query (terms, "quoted phrases", AND/OR/NOT) and return
+    [(base_dir, run_dir, path)] of matching files."""
+    rows = conn.execute(
+        "SELECT f.base_dir, f.run_dir, f.path FROM docs JOIN files f ON f.id = docs.rowid "
+        "WHERE docs MATCH ? ORDER BY f.path",
+        (query,),
+    )
+    return rows.fetchall()
+
+
+def search_regex(conn, pattern, prefilter=None):
+    """Return [(base_dir, run_dir, path, hits)] for files matching `pattern`.
+
+    The regex runs case-insensitively over the lower-cased text. `prefilter` is an optional literal
+    substring every match must contain; it narrows the candidates through the
+    index so only those files' text is scanned.
+    """
+    rx = re.compile(pattern, re.IGNORECASE)
+    if prefilter:
+        candidates = _candidates(conn, prefilter.lower())
+    else:
+        candidates = conn.execute("SELECT rowid, content FROM docs")
+
+    hits = {}
+    for file_id, content in candidates:
+        n = sum(1 for _ in rx.finditer(content))
+        if n:
+            hits[file_id] = n
+
+    out = []
+    for file_id, n in hits.items():
+        base_dir, run_dir, path = conn.execute(
+            "SELECT base_dir, run_dir, path FROM files WHERE id = ?", (file_id,)
+        ).fetchone()
+        out.append((base_dir, run_dir, path, n))
+    return sorted(out, key=lambda r: r[2])
+
+
+def _print_per_run(rows):
+    per_run = Counter()
+    for base_dir, run_dir, path, n in rows:
+        print(f"{n}\t{path}")
+        per_run[(base_dir, run_dir)] += n
+    print(f"\n{len(rows)} files in {len(per_run)} runs")
+    for (base_dir, run_dir), n in per_run.most_common():
+        print(f"{n}\t{base_dir}/{run_dir}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the log full-text index.")
+    parser.add_argument("--db", default=DEFAULT_DB, help="index database path")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p_build = sub.add_parser("build", help="index new or changed logs")
+    p_build.add_argument("base_dirs", nargs="*", default=list(BASE_DIRS))
+
+    p_term = sub.add_parser("term", help="substring term or phrase with per-run hit counts")
+    p_term.add_argument("term")
+    p_term.add_argument("--base-dir", default="logs_failure")
+
+    p_forget = sub.add_parser("forget", help="drop cached hit counts for terms")
+    p_forget.add_argument("terms", nargs="*")
+    p_forget.add_argument("--all", action="store_true", help="drop every cached term")
+
+    p_query = sub.add_parser("query", help="raw FTS5 query")
+    p_query.add_argument("query")
+
+    p_regex = sub.add_parser("regex", help="regular expression, optionally prefiltered by a literal")
+    p_regex.add_argument("pattern")
+    p_regex.add_argument("--prefilter")
+
+    args = parser.parse_args()
+    conn = open_index(args.db)
+
+    if args.cmd == "build":
+        added, updated, removed = update_index(conn, args.base_dirs)
+        print(f"Indexed {added} new, {updated} changed, {removed} removed files in {args.db}")
+    elif args.cmd == "term":
+        counts = term_counts(conn, args.term, args.base_dir)
+        for run_dir, n in counts.most_common():
+            print(f"{n}\t{run_dir}")
+        print(f"\n{len(counts)} runs matched")
+    elif args.cmd == "forget":
+        terms = [r[0] for r in conn.execute("SELECT term FROM terms")] if args.all else args.terms
+        print(f"Dropped {forget_terms(conn, terms)} cached terms")
+    elif args.cmd == "query":
+        try:
+            rows = search(conn, args.query)
+        except sqlite3.OperationalError as e:
+            parser.error(f"invalid FTS5 query {args.query!r}: {e}")
+        for base_dir, run_dir, path in rows:
+            print(path)
+        print(f"\n{len(rows)} files matched")
+    elif args.cmd == "regex":
+        try:
+            rows = search_regex(conn, args.pattern, args.prefilter)
+        except (re.error, sqlite3.OperationalError) as e:
+            parser.error(f"invalid pattern {args.pattern!r}: {e}")
+        _print_per_run(rows)
+
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -4,11 +4,19 @@
 Produces `data_for_model.csv` with one row per extracted run directory under
 `logs_failure/` (and optionally `logs_normal/` if present). Features include
 counts of files, total log size, counts of memory-related keywords, and ratios.
+
+Set `LOG_INDEX=logs_index.sqlite` to take file stats and keyword counts from
+the full-text index (see `log_index.py`) instead of re-reading every log; the
+index is refreshed incrementally first, so only new or changed files are read.
+With `VERIFY_INDEX=1` as well, every run is also re-scanned with `analyze_run`
+and any run whose indexed stats differ is reported.
 """
 import os
 import csv
 from collections import Counter
 
+import log_index
+
 KEYWORDS = ["137", "killed", "oom", "out of memory", "memory limit", "no memory"]
 
 
@@ -38,7 +46,7 @@ def analyze_run(path):
             file_count += 1
 
             # only inspect reasonable text files
-            if fn.lower().endswith((".txt", ".log", ".out", ".err", ".trace")) or sz < 200000:
+            if log_index.is_text_file(fn, sz):
                 try:
                     with open(fp, "r", errors="ignore") as fh:
                         content = fh.read().lower()
@@ -59,11 +67,58 @@ def analyze_run(path):
     }
 
 
+def analyze_runs_from_index(db_path, base_dir="logs_failure"):
+    """Yield (run_dir, stats) like analyze_run, using the full-text index."""
+    conn = log_index.open_index(db_path)
+    try:
+        log_index.update_index(conn, [base_dir])
+        counts = log_index.keyword_counts(conn, KEYWORDS, base_dir)
+        stats = log_index.run_stats(conn, base_dir)
+        for name, _ in iter_run_dirs(base_dir):
+            # empty run directories have no rows in the index
+            file_count, text_file_count, total_size = stats.get(name, (0, 0, 0))
+            keyword_counts = counts.get(name, Counter())
+            yield name, {
+                "file_count": file_count,
+                "text_file_count": text_file_count,
+                "total_size": total_size,
+                "avg_file_size": (total_size / file_count) if file_count else 0,
+                **{f"kw_count_{k}": keyword_counts[k.lower()] for k in KEYWORDS},
+                "kw_total": sum(keyword_counts[k.lower()] for k in KEYWORDS),
+            }
+    finally:
+        conn.close()
+
+
+def verify_index(db_path, base_dir="logs_failure"):
+    """Compare indexed stats with a raw analyze_run scan; return mismatching run dirs."""
+    paths = dict(iter_run_dirs(base_dir))
+    mismatched = []
+    for name, stats in analyze_runs_from_index(db_path, base_dir):
+        raw = analyze_run(paths[name])
+        if stats != raw:
+            diff = {k: (raw[k], stats[k]) for k in raw if raw[k] != stats.get(k)}
+            print(f"Index mismatch for {name} (raw, index): {diff}")
+            mismatched.append(name)
+    return mismatched
+
+
+def iter_run_stats(base_dir="logs_failure"):
+    db_path = os.environ.get("LOG_INDEX")
+    if db_path:
+        if os.environ.get("VERIFY_INDEX") and verify_index(db_path, base_dir):
+            raise SystemExit("Log index disagrees with the raw logs; rebuild it or drop LOG_INDEX.")
+        yield from analyze_runs_from_index(db_path, base_dir)
+        return
+    for name, path in iter_run_dirs(base_dir):
+        yield name, analyze_run(path)
+
+
 def main():
     out_file = "data_for_model.csv"
     rows = []
 
-    for name, path in iter_run_dirs("logs_failure"):
+    for name, stats in iter_run_stats("logs_failure"):
         # parse repo and run_id from folder name like owner_repo_12345
         parts = name.rsplit("_", 1)
         if len(parts) == 2:
@@ -72,7 +127,6 @@ def main():
             repo_str = name
             run_id = ""
 
-        stats = analyze_run(path)
         row = {
             "run_dir": name,
             "repo": repo_str,
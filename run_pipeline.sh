@@ -23,6 +23,12 @@ python3 "$ROOT_DIR/get_data.py"
 echo "Downloading logs..."
 python3 "$ROOT_DIR/download.py"
 
+# filter_momory_logs.py reads from this index instead of the raw logs
+export LOG_INDEX="${LOG_INDEX:-logs_index.sqlite}"
+
+echo "Indexing extracted logs..."
+python3 "$ROOT_DIR/log_index.py" build
+
 echo "Filtering memory-related logs..."
 python3 "$ROOT_DIR/filter_momory_logs.py"
 
@@ -5,51 +5,52 @@ Outputs:
  - docs/repo_top10_summary.csv
  - docs/dataset_summary.md
  - docs/repo_top10.md (markdown table for quick copy)
+
+Aggregates come from the shared cache in `report_data.py`.
 """
-from pathlib import Path
-import pandas as pd
+from report_data import ROOT, load_aggregates, render
 
-root = Path(__file__).resolve().parent.parent
-out = root / 'docs'
-out.mkdir(parents=True, exist_ok=True)
 
-an_path = root / 'anomaly_scores.csv'
-df_path = root / 'data_for_model.csv'
+# Dataset summary
+def write_dataset_summary(agg, out):
+    s = agg['summary']
+    with open(out / 'dataset_summary.md', 'w') as fh:
+        fh.write('# Dataset summary\n\n')
+        fh.write(f'- Total runs analyzed: {s["n_runs"]}\n')
+        fh.write(f'- Total anomalies flagged: {s["n_anom"]}\n')
+        fh.write(f'- Overall anomaly rate: {s["anomaly_rate"]:.2%}\n')
+        fh.write(f'- Distinct repositories: {s["n_repos"]}\n')
 
-if not an_path.exists():
-    raise SystemExit('Missing anomaly_scores.csv')
-if not df_path.exists():
-    raise SystemExit('Missing data_for_model.csv')
 
-an = pd.read_csv(an_path)
-df = pd.read_csv(df_path)
+def _top10(agg):
+    return agg['repo'].head(10)[['total_runs', 'anomalies', 'anomaly_rate']].reset_index()
 
-# Dataset summary
-n_runs = len(an)
-n_anom = int(an['anomaly'].astype(bool).sum())
-uniq_repos = an['repo'].nunique()
-
-with open(out / 'dataset_summary.md', 'w') as fh:
-    fh.write('# Dataset summary\n\n')
-    fh.write(f'- Total runs analyzed: {n_runs}\n')
-    fh.write(f'- Total anomalies flagged: {n_anom}\n')
-    fh.write(f'- Overall anomaly rate: {n_anom / n_runs:.2%}\n')
-    fh.write(f'- Distinct repositories: {uniq_repos}\n')
-
-# Repo level aggregation
-agg = an.groupby('repo').agg(total_runs=('run_dir','size'), anomalies=('anomaly', lambda s: s.astype(bool).sum()))
-agg['anomaly_rate'] = agg['anomalies'] / agg['total_runs']
-agg = agg.sort_values('anomalies', ascending=False)
 
 # Save top 10
-top10 = agg.head(10).reset_index()
-top10.to_csv(out / 'repo_top10_summary.csv', index=False)
+def write_top10_csv(agg, out):
+    _top10(agg).to_csv(out / 'repo_top10_summary.csv', index=False)
+
 
 # Also write a markdown table
-with open(out / 'repo_top10.md', 'w') as fh:
-    fh.write('| Rank | Repository | Runs analyzed | Anomalous runs | Anomaly rate |\n')
-    fh.write('|---:|---|---:|---:|---:|\n')
-    for i, row in top10.iterrows():
-        fh.write(f'| {i+1} | {row.repo} | {row.total_runs} | {row.anomalies} | {row.anomaly_rate:.2%} |\n')
+def write_top10_markdown(agg, out):
+    top10 = _top10(agg)
+    with open(out / 'repo_top10.md', 'w') as fh:
+        fh.write('| Rank | Repository | Runs analyzed | Anomalous runs | Anomaly rate |\n')
+        fh.write('|---:|---|---:|---:|---:|\n')
+        for i, row in top10.iterrows():
+            fh.write(f'| {i+1} | {row.repo} | {row.total_runs} | {row.anomalies} | {row.anomaly_rate:.2%} |\n')
+
+
+TABLES = [write_dataset_summary, write_top10_csv, write_top10_markdown]
+
+
+def main():
+    out = ROOT / 'docs'
+    out.mkdir(parents=True, exist_ok=True)
+
+    render(TABLES, load_aggregates(), out)
+    print('Wrote docs/repo_top10_summary.csv, docs/repo_top10.md, docs/dataset_summary.md')
+
 
-print('Wrote docs/repo_top10_summary.csv, docs/repo_top10.md, docs/dataset_summary.md')
+if __name__ == '__main__':
+    main()
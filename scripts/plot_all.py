@@ -1,101 +1,132 @@
 #!/usr/bin/env python3
-import os
-from pathlib import Path
-import pandas as pd
+"""Render the Chapter 4 figures from the cached report aggregates.
+
+Each figure is an independent task drawn from the pre-binned aggregates in
+`report_data.py`, so the figures render in parallel and their cost does not
+grow with the number of runs.
+"""
 import numpy as np
+import matplotlib
+matplotlib.use('Agg')
 import matplotlib.pyplot as plt
+from matplotlib.colors import LogNorm
 
-root = Path(__file__).resolve().parent.parent
-out_dir = root / 'docs' / 'figures'
-out_dir.mkdir(parents=True, exist_ok=True)
-
-# Load data
-an = pd.read_csv(root / 'anomaly_scores.csv')
-df = pd.read_csv(root / 'data_for_model.csv')
+from report_data import ROOT, load_aggregates, render
 
-# Merge on run_dir (both files use this)
-if 'run_dir' in an.columns and 'run_dir' in df.columns:
-    merged = an.merge(df, on=['run_dir', 'repo', 'run_id'], how='left')
-else:
-    merged = an.copy()
 
 # figure 1: histogram of anomaly scores
-plt.figure(figsize=(6,4))
-plt.hist(merged['score'].dropna(), bins=40, color='#3b6ea0', edgecolor='white')
-plt.xlabel('Isolation Forest score')
-plt.ylabel('Number of runs')
-plt.title('Distribution of anomaly scores')
-plt.grid(axis='y', alpha=0.2)
-plt.tight_layout()
-plt.savefig(out_dir / 'score_hist_300dpi.png', dpi=300)
-plt.close()
+def plot_score_hist(agg, out_dir):
+    counts, edges = agg['score_hist']
+    plt.figure(figsize=(6,4))
+    plt.stairs(counts, edges, fill=True, color='#3b6ea0', edgecolor='white')
+    plt.xlabel('Isolation Forest score')
+    plt.ylabel('Number of runs')
+    plt.title('Distribution of anomaly scores')
+    plt.grid(axis='y', alpha=0.2)
+    plt.tight_layout()
+    plt.savefig(out_dir / 'score_hist_300dpi.png', dpi=300)
+    plt.close()
+
 
 # figure 2: anomalies count per repo (top 12 by count)
-repo_counts = merged.groupby('repo').agg(total_runs=('run_dir','size'),
-                                         anomalies=('anomaly', lambda s: s.astype(bool).sum()))
-repo_counts = repo_counts.sort_values('anomalies', ascending=False)
-repo_top = repo_counts.head(12)
-
-plt.figure(figsize=(8,5))
-repo_top['anomalies'].plot(kind='bar', color='#d9534f')
-plt.ylabel('Anomalous runs')
-plt.title('Top repositories by anomaly count')
-plt.xticks(rotation=45, ha='right')
-plt.tight_layout()
-plt.savefig(out_dir / 'anomalies_per_repo_300dpi.png', dpi=300)
-plt.close()
+def plot_anomalies_per_repo(agg, out_dir):
+    repo_top = agg['repo'].head(12)
+    plt.figure(figsize=(8,5))
+    repo_top['anomalies'].plot(kind='bar', color='#d9534f')
+    plt.ylabel('Anomalous runs')
+    plt.title('Top repositories by anomaly count')
+    plt.xticks(rotation=45, ha='right')
+    plt.tight_layout()
+    plt.savefig(out_dir / 'anomalies_per_repo_300dpi.png', dpi=300)
+    plt.close()
+
 
 # figure 3: anomaly rate per repo (repos with at least 10 runs)
-repo_counts['rate'] = repo_counts['anomalies'] / repo_counts['total_runs']
-repo_sample = repo_counts[repo_counts['total_runs']>=10].sort_values('rate', ascending=False).head(12)
-
-plt.figure(figsize=(8,5))
-repo_sample['rate'].plot(kind='bar', color='#5cb85c')
-plt.ylabel('Anomaly rate')
-plt.title('Top repositories by anomaly rate (>=10 runs)')
-plt.xticks(rotation=45, ha='right')
-plt.tight_layout()
-plt.savefig(out_dir / 'anomaly_rate_per_repo_300dpi.png', dpi=300)
-plt.close()
-
-# figure 4: scatter kw_total vs total_size colored by anomaly
-# use log scale for total_size to compress range
-plt.figure(figsize=(7,5))
-mask = ~merged['total_size'].isna()
-xs = merged.loc[mask, 'total_size']
-ys = merged.loc[mask, 'kw_total']
-colors = merged.loc[mask, 'anomaly'].map({True: '#d9534f', False: '#3b6ea0'})
-plt.scatter(xs, ys, c=colors, alpha=0.6, edgecolor='none')
-plt.xscale('log')
-plt.xlabel('Total log size (bytes, log scale)')
-plt.ylabel('Total memory-related keyword count')
-plt.title('Memory-keyword counts vs total log size (anomalies in red)')
-plt.tight_layout()
-plt.savefig(out_dir / 'kw_total_vs_size_scatter_300dpi.png', dpi=300)
-plt.close()
+def plot_anomaly_rate_per_repo(agg, out_dir):
+    repo = agg['repo']
+    repo_sample = repo[repo['total_runs']>=10].sort_values('anomaly_rate', ascending=False).head(12)
+    plt.figure(figsize=(8,5))
+    repo_sample['anomaly_rate'].plot(kind='bar', color='#5cb85c')
+    plt.ylabel('Anomaly rate')
+    plt.title('Top repositories by anomaly rate (>=10 runs)')
+    plt.xticks(rotation=45, ha='right')
+    plt.tight_layout()
+    plt.savefig(out_dir / 'anomaly_rate_per_repo_300dpi.png', dpi=300)
+    plt.close()
+
+
+# figure 4: binned kw_total vs total_size; runs per bin and anomalous runs per bin
+# log scale for total_size, symlog for kw_total
+def plot_kw_vs_size(agg, out_dir):
+    bins = agg['size_kw']
+    if bins is None:
+        return
+    runs = bins['runs']
+    anomalies = bins['anomalies']
+    fig, (ax_n, ax_r) = plt.subplots(1, 2, figsize=(12,5), sharey=True)
+
+    mesh = ax_n.pcolormesh(bins['size_edges'], bins['kw_edges'], np.ma.masked_equal(runs, 0).T,
+                           cmap='viridis', norm=LogNorm())
+    fig.colorbar(mesh, ax=ax_n, label='Runs in bin')
+    ax_n.set_title('Runs per bin')
+    ax_n.set_ylabel('Total memory-related keyword count (symlog)')
+
+    mesh = ax_r.pcolormesh(bins['size_edges'], bins['kw_edges'], np.ma.masked_equal(anomalies, 0).T,
+                           cmap='plasma', norm=LogNorm(vmin=1, vmax=max(anomalies.max(), 1)))
+    fig.colorbar(mesh, ax=ax_r, label='Anomalous runs in bin')
+    ax_r.set_title('Anomalous runs per bin')
+
+    for ax in (ax_n, ax_r):
+        ax.set_xscale('log')
+        ax.set_yscale('symlog', linthresh=1)
+        ax.set_xlabel('Total log size (bytes, log scale)')
+    fig.suptitle('Memory-keyword counts vs total log size (binned)')
+    fig.tight_layout()
+    fig.savefig(out_dir / 'kw_total_vs_size_scatter_300dpi.png', dpi=300)
+    plt.close(fig)
+
 
 # figure 5: boxplot of total_size by anomaly flag (log scale)
-import math
-vals_anom = merged.loc[merged['anomaly']==True, 'total_size'].dropna()
-vals_norm = merged.loc[merged['anomaly']==False, 'total_size'].dropna()
-
-plt.figure(figsize=(5,5))
-plt.boxplot([np.log10(vals_norm[vals_norm>0]), np.log10(vals_anom[vals_anom>0])], labels=['normal','anomaly'])
-plt.ylabel('log10(total_size)')
-plt.title('Log of total log size: anomalies vs normal')
-plt.tight_layout()
-plt.savefig(out_dir / 'size_boxplot_300dpi.png', dpi=300)
-plt.close()
+def plot_size_boxplot(agg, out_dir):
+    plt.figure(figsize=(5,5))
+    plt.gca().bxp(agg['size_box'], showfliers=False)
+    plt.ylabel('log10(total_size)')
+    plt.title('Log of total log size: anomalies vs normal')
+    plt.tight_layout()
+    plt.savefig(out_dir / 'size_boxplot_300dpi.png', dpi=300)
+    plt.close()
+
 
 # figure 6: average kw_total per repo (top 12 by mean kw)
-mean_kw = merged.groupby('repo')['kw_total'].mean().sort_values(ascending=False).head(12)
-plt.figure(figsize=(8,5))
-mean_kw.plot(kind='bar', color='#f0ad4e')
-plt.ylabel('Average kw_total')
-plt.title('Average memory-keyword counts per repository (top 12)')
-plt.xticks(rotation=45, ha='right')
-plt.tight_layout()
-plt.savefig(out_dir / 'avg_kw_per_repo_300dpi.png', dpi=300)
-plt.close()
-
-print('Saved figures to', out_dir)
+def plot_avg_kw_per_repo(agg, out_dir):
+    mean_kw = agg['repo']['mean_kw'].sort_values(ascending=False).head(12)
+    plt.figure(figsize=(8,5))
+    mean_kw.plot(kind='bar', color='#f0ad4e')
+    plt.ylabel('Average kw_total')
+    plt.title('Average memory-keyword counts per repository (top 12)')
+    plt.xticks(rotation=45, ha='right')
+    plt.tight_layout()
+    plt.savefig(out_dir / 'avg_kw_per_repo_300dpi.png', dpi=300)
+    plt.close()
+
+
+FIGURES = [
+    plot_score_hist,
+    plot_anomalies_per_repo,
+    plot_anomaly_rate_per_repo,
+    plot_kw_vs_size,
+    plot_size_boxplot,
+    plot_avg_kw_per_repo,
+]
+
+
+def main():
+    out_dir = ROOT / 'docs' / 'figures'
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    render(FIGURES, load_aggregates(), out_dir)
+    print('Saved figures to', out_dir)
+
+
+if __name__ == '__main__':
+    main()
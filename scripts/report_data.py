@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""Shared data layer for the report scripts.
+
+`plot_all.py` and `generate_chapter_tables.py` both need the same merge of
+`anomaly_scores.csv` and `data_for_model.csv` and the same per-repo groupbys.
+Run and anomaly counts come from `anomaly_scores.csv` alone, so duplicate rows
+in `data_for_model.csv` cannot inflate the chapter tables.
+`load_aggregates()` computes those once and caches the (small) result in
+`docs/.cache/aggregates.joblib`, keyed on a hash of the two input files, so
+regenerating reports only touches the raw CSVs when they have changed.
+
+Dense per-run distributions are reduced to histograms / 2D bins here, so the
+figures never plot one marker per run. `render()` runs independent figure
+and table tasks on a process pool.
+"""
+import os
+import hashlib
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import joblib
+from matplotlib import cbook
+
+# bump when the layout of the cached aggregates changes
+CACHE_VERSION = 3
+
+ROOT = Path(__file__).resolve().parent.parent
+INPUTS = ('anomaly_scores.csv', 'data_for_model.csv')
+CACHE_FILE = Path('docs') / '.cache' / 'aggregates.joblib'
+
+SCORE_BINS = 40
+SIZE_BINS = 60
+KW_BINS = 50
+
+
+def _input_hash(root):
+    h = hashlib.sha256(f'v{CACHE_VERSION}'.encode())
+    for name in INPUTS:
+        path = root / name
+        if not path.exists():
+            raise SystemExit(f'Missing {name}')
+        with open(path, 'rb') as fh:
+            for chunk in iter(lambda: fh.read(1 << 20), b''):
+                h.update(chunk)
+    return h.hexdigest()
+
+
+def _load(root):
+    """Return (anomaly scores, scores left-merged with the size/keyword features)."""
+    an = pd.read_csv(root / 'anomaly_scores.csv')
+    an['anomaly'] = an['anomaly'].astype(bool)
+    df = pd.read_csv(root / 'data_for_model.csv',
+                     usecols=lambda c: c in ('run_dir', 'repo', 'run_id', 'total_size', 'kw_total'))
+
+    # Merge on run_dir (both files use this)
+    if 'run_dir' in an.columns and 'run_dir' in df.columns:
+        return an, an.merge(df, on=['run_dir', 'repo', 'run_id'], how='left')
+    return an, an.assign(total_size=np.nan, kw_total=np.nan)
+
+
+def _size_kw_bins(merged):
+    """2D bins of log10(total_size) x log1p(kw_total) with run and anomaly counts per bin."""
+    sub = merged[(merged['total_size'] > 0) & merged['kw_total'].notna()]
+    if sub.empty:
+        return None
+    x = np.log10(sub['total_size'].to_numpy(dtype=float))
+    y = np.log1p(sub['kw_total'].to_numpy(dtype=float))
+    x_edges = np.linspace(x.min(), x.max() + 1e-9, SIZE_BINS + 1)
+    y_edges = np.linspace(y.min(), y.max() + 1e-9, KW_BINS + 1)
+    runs, _, _ = np.histogram2d(x, y, bins=[x_edges, y_edges])
+    anomalies, _, _ = np.histogram2d(x[sub['anomaly'].to_numpy()], y[sub['anomaly'].to_numpy()],
+                                     bins=[x_edges, y_edges])
+    return {'size_edges': 10 ** x_edges, 'kw_edges': np.expm1(y_edges), 'runs': runs, 'anomalies': anomalies}
+
+
+def _size_box_stats(merged):
+    stats = []
+    for label, flag in (('normal', False), ('anomaly', True)):
+        vals = merged.loc[merged['anomaly'] == flag, 'total_size'].dropna()
+        vals = np.log10(vals[vals > 0].to_numpy(dtype=float))
+        if len(vals):
+            stats.extend(cbook.boxplot_stats(vals, labels=[label]))
+    return stats
+
+
+def build_aggregates(root=ROOT):
+    an, merged = _load(root)
+
+    n_runs = len(an)
+    n_anom = int(an['anomaly'].sum())
+    summary = {
+        'n_runs': n_runs,
+        'n_anom': n_anom,
+        'anomaly_rate': n_anom / n_runs if n_runs else 0.0,
+        'n_repos': an['repo'].nunique(),
+    }
+
+    # Repo level aggregation
+    repo = an.groupby('repo').agg(total_runs=('run_dir', 'size'),
+                                  anomalies=('anomaly', 'sum'))
+    repo['mean_kw'] = merged.groupby('repo')['kw_total'].mean()
+    repo['anomaly_rate'] = repo['anomalies'] / repo['total_runs']
+    repo = repo.sort_values('anomalies', ascending=False)
+
+    score_counts, score_edges = np.histogram(an['score'].dropna(), bins=SCORE_BINS)
+
+    return {
+        'summary': summary,
+        'repo': repo,
+        'score_hist': (score_counts, score_edges),
+        'size_box': _size_box_stats(merged),
+        'size_kw': _size_kw_bins(merged),
+    }
+
+
+def load_aggregates(root=ROOT, refresh=False):
+    """Return cached aggregates, rebuilding them if the input CSVs changed."""
+    key = _input_hash(root)
+    cache_path = root / CACHE_FILE
+    if not refresh and cache_path.exists():
+        try:
+            cached = joblib.load(cache_path)
+            if cached.get('key') == key:
+                return cached['aggregates']
+        except Exception:
+            pass
+
+    aggregates = build_aggregates(root)
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    joblib.dump({'key': key, 'aggregates': aggregates}, cache_path)
+    return aggregates
+
+
+def render(tasks, aggregates, out_dir, workers=None):
+    """Run independent `task(aggregates, out_dir)` callables on a process pool.
+
+    Tasks must be module-level functions so they can be pickled. Returns the
+    task results in order.
+    """
+    workers = workers or int(os.environ.get('WORKERS', '0')) or min(len(tasks), os.cpu_count() or 1)
+    if workers <= 1:
+        return [task(aggregates, out_dir) for task in tasks]
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        futures = [ex.submit(task, aggregates, out_dir) for task in tasks]
+        return [f.result() for f in futures]